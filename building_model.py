@@ -1,10 +1,12 @@
 import json
+import orjson
 import requests
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field
 from typing import List, Optional
 from datetime import datetime, time
+from http_session import get_json
 
-@dataclass
+@dataclass(slots=True)
 class Classroom:
     """Represents a classroom within a building"""
     id: int
@@ -13,24 +15,17 @@ class Classroom:
     capacity: Optional[int] = None
     has_whiteboard: bool = True
     has_projector: bool = True
-    availability_times: List[dict] = None
-    
-    def __post_init__(self):
-        if self.availability_times is None:
-            self.availability_times = []
+    availability_times: List[dict] = field(default_factory=list)
     
     def add_availability(self, start_time: time, end_time: time, day_of_week: str):
-        """Add an availability time slot"""
+        """Add an availability time slot, stored as ISO strings so it serializes as-is"""
         self.availability_times.append({
-            'start_time': start_time,
-            'end_time': end_time,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
             'day_of_week': day_of_week
         })
 
-    def to_dict(self):
-        return asdict(self)
-
-@dataclass
+@dataclass(slots=True)
 class Building:
     """Represents a campus building with classrooms"""
     name: str
@@ -52,12 +47,6 @@ class Building:
             classrooms=[]
         )
 
-    def to_dict(self):
-        return {
-            **asdict(self),
-            "classrooms": [classroom.to_dict() for classroom in self.classrooms]
-        }
-
 class CampusBuilder:
     """Utility class to build campus building data"""
     BUILDINGS_API_URL = "https://api.umd.io/v1/map/buildings"
@@ -66,9 +55,7 @@ class CampusBuilder:
     def fetch_buildings(cls) -> List[Building]:
         """Fetch building data from UMD.io API"""
         try:
-            response = requests.get(cls.BUILDINGS_API_URL)
-            response.raise_for_status()
-            buildings_data = response.json()
+            buildings_data = get_json(cls.BUILDINGS_API_URL)
             
             # Create Building objects from API data
             buildings = [Building.from_api_data(b_data) for b_data in buildings_data]
@@ -91,18 +78,17 @@ class CampusBuilder:
             # Process each room and add to appropriate building
             for room_data in rooms_data:
                 # Extract building code from room name (e.g., "ESJ 0202" -> "ESJ")
-                room_parts = room_data["name"].split()
-                if len(room_parts) >= 2:
-                    building_code = room_parts[0]
-                    room_number = " ".join(room_parts[1:])
-                    
-                    if building_code in building_map:
-                        classroom = Classroom(
-                            id=room_data["id"],
-                            name=room_data["name"],
-                            room_number=room_number
-                        )
-                        building_map[building_code].classrooms.append(classroom)
+                building_code, sep, room_number = room_data["name"].partition(" ")
+                if not sep or not room_number:
+                    continue
+                building = building_map.get(building_code)
+                if building is None:
+                    continue
+                building.classrooms.append(Classroom(
+                    id=room_data["id"],
+                    name=room_data["name"],
+                    room_number=room_number
+                ))
             
         except FileNotFoundError:
             print(f"Error: Could not find {json_file}")
@@ -120,10 +106,9 @@ def main():
     # Filter out buildings with no classrooms
     buildings_with_classrooms = [building for building in buildings if building.classrooms]
     
-    # Convert filtered buildings data to dictionary format and export to JSON
-    buildings_data = [building.to_dict() for building in buildings_with_classrooms]
-    with open("buildings_data.json", "w") as f:
-        json.dump(buildings_data, f, indent=4, default=str)
+    # Export filtered buildings to JSON, orjson serializes the dataclasses directly
+    with open("buildings_data.json", "wb") as f:
+        f.write(orjson.dumps(buildings_with_classrooms, option=orjson.OPT_INDENT_2))
     
     print("Building data with classrooms has been exported to buildings_data.json")
 
@@ -1,12 +1,26 @@
 import json
+import orjson
 import requests
-from dataclasses import dataclass, asdict
+from collections import defaultdict
+from dataclasses import dataclass, field
 from typing import List, Optional
 from datetime import datetime
+from itertools import chain
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm  # Import tqdm for progress bar
-
-@dataclass
+from http_session import fetch_concurrency, get_json, thread_session
+
+AVAILABILITY_URL = "https://25live.collegenet.com/25live/data/umd/run/availability/availabilitydata.json"
+# Query parameters shared by every availability request; only the dates, page size and rooms vary
+BASE_AVAILABILITY_PARAMS = {
+    "obj_cache_accl": "0",
+    "comptype": "availability_daily",
+    "compsubject": "location",
+    "include": "closed blackouts pending related empty",
+    "caller": "pro-AvailService.getData"
+}
+
+@dataclass(slots=True)
 class Classroom:
     """Represents a classroom within a building"""
     id: int
@@ -15,16 +29,9 @@ class Classroom:
     capacity: Optional[int] = None
     has_whiteboard: bool = True
     has_projector: bool = True
-    availability_times: List[dict] = None
-
-    def __post_init__(self):
-        if self.availability_times is None:
-            self.availability_times = []
+    availability_times: List[dict] = field(default_factory=list)
 
-    def to_dict(self):
-        return asdict(self)
-
-@dataclass
+@dataclass(slots=True)
 class Building:
     """Represents a campus building with classrooms"""
     name: str
@@ -46,12 +53,6 @@ class Building:
             classrooms=[]
         )
 
-    def to_dict(self):
-        return {
-            **asdict(self),
-            "classrooms": [classroom.to_dict() for classroom in self.classrooms]
-        }
-
 class CampusBuilder:
     """Utility class to build campus building data"""
     BUILDINGS_API_URL = "https://api.umd.io/v1/map/buildings"
@@ -60,9 +61,7 @@ class CampusBuilder:
     def fetch_buildings(cls) -> List[Building]:
         """Fetch building data from UMD.io API"""
         try:
-            response = requests.get(cls.BUILDINGS_API_URL)
-            response.raise_for_status()
-            buildings_data = response.json()
+            buildings_data = get_json(cls.BUILDINGS_API_URL)
 
             # Create Building objects from API data
             buildings = [Building.from_api_data(b_data) for b_data in buildings_data]
@@ -85,79 +84,72 @@ class CampusBuilder:
             # Process each room and add to appropriate building
             for room_data in rooms_data:
                 # Extract building code from room name (e.g., "ESJ 0202" -> "ESJ")
-                room_parts = room_data["name"].split()
-                if len(room_parts) >= 2:
-                    building_code = room_parts[0]
-                    room_number = " ".join(room_parts[1:])
-
-                    if building_code in building_map:
-                        classroom = Classroom(
-                            id=room_data["id"],
-                            name=room_data["name"],
-                            room_number=room_number
-                        )
-                        building_map[building_code].classrooms.append(classroom)
+                building_code, sep, room_number = room_data["name"].partition(" ")
+                if not sep or not room_number:
+                    continue
+                building = building_map.get(building_code)
+                if building is None:
+                    continue
+                building.classrooms.append(Classroom(
+                    id=room_data["id"],
+                    name=room_data["name"],
+                    room_number=room_number
+                ))
 
         except FileNotFoundError:
             print(f"Error: Could not find {json_file}")
         except json.JSONDecodeError:
             print(f"Error: Invalid JSON in {json_file}")
 
-def fetch_availability_for_classroom(classroom, start_date=None, page_size=100):
+def fetch_availability_for_classroom(classroom, start_date=None, page_size=100, session=None):
     """
     Fetches room availability data for a specified classroom and updates its availability_times.
+    Uses the calling thread's session unless one is given.
     """
+    if session is None:
+        session = thread_session()
     if start_date is None:
         start_date = datetime.today().strftime("%Y-%m-%d")
         
     start_datetime = f"{start_date}T00:00:00"
     
-    url = "https://25live.collegenet.com/25live/data/umd/run/availability/availabilitydata.json"
+    url = AVAILABILITY_URL
     params = {
-        "obj_cache_accl": "0",
+        **BASE_AVAILABILITY_PARAMS,
         "start_dt": start_datetime,
-        "comptype": "availability_daily",
-        "compsubject": "location",
         "page_size": str(page_size),
-        "space_id": str(classroom.id),
-        "include": "closed blackouts pending related empty",
-        "caller": "pro-AvailService.getData"
+        "space_id": str(classroom.id)
     }
     
     try:
-        response = requests.get(url, params=params, timeout=10)  # Added timeout for robustness
+        response = session.get(url, params=params, timeout=10)  # Added timeout for robustness
         response.raise_for_status()  # Raises HTTPError for bad responses
-        data = response.json()
+        data = orjson.loads(response.content)
 
-        # Use a dictionary to group events by date, time_start, and time_end
-        availability_dict = {}
-        for subject in data.get("subjects", []):
+        # Group events by date, time_start, and time_end; the first item of a slot sets its status
+        names = defaultdict(list)
+        details = defaultdict(list)
+        status = {}
+        for subject in data.get("subjects", ()):
             date = subject.get("item_date", "")
-            for item in subject.get("items", []):
-                time_start = item.get("start", "N/A")
-                time_end = item.get("end", "N/A")
-                key = (date, time_start, time_end)
-                if key not in availability_dict:
-                    availability_dict[key] = {
-                        "date": date,
-                        "event_name": [item.get("itemName", "N/A")],
-                        "time_start": time_start,
-                        "time_end": time_end,
-                        "status": item.get("type_id", "N/A"),  
-                        "additional_details": [item.get("itemId2", "N/A")]
-                    }
-                else:
-                    availability_dict[key]["event_name"].append(item.get("itemName", "N/A"))
-                    availability_dict[key]["additional_details"].append(item.get("itemId2", "N/A"))
-        
-        # Convert the grouped data back into a list and combine event names
-        availability = []
-        for entry in availability_dict.values():
-            entry["event_name"] = ', '.join(entry["event_name"])
-            entry["additional_details"] = ', '.join(map(str, entry["additional_details"]))
-            availability.append(entry)
-        
-        classroom.availability_times = availability
+            for item in subject.get("items", ()):
+                key = (date, item.get("start", "N/A"), item.get("end", "N/A"))
+                names[key].append(item.get("itemName", "N/A"))
+                details[key].append(str(item.get("itemId2", "N/A")))
+                status.setdefault(key, item.get("type_id", "N/A"))
+
+        # Materialize the grouped slots once, combining event names
+        classroom.availability_times = [
+            {
+                "date": key[0],
+                "event_name": ', '.join(event_names),
+                "time_start": key[1],
+                "time_end": key[2],
+                "status": status[key],
+                "additional_details": ', '.join(details[key])
+            }
+            for key, event_names in names.items()
+        ]
 
     except requests.exceptions.RequestException as e:
         print(f"Request error for classroom {classroom.id}: {e}")
@@ -169,10 +161,16 @@ def fetch_availability_for_classroom(classroom, start_date=None, page_size=100):
         print(f"Unexpected error for classroom {classroom.id}: {e}")
         classroom.availability_times = []
 
-def fetch_availability_for_all_classrooms(classrooms, start_date=None, max_workers=20):
+def fetch_availability_for_all_classrooms(classrooms, start_date=None, max_workers=None):
     """
     Fetches availability data for multiple classrooms using multithreading.
+    max_workers defaults to fetch_concurrency(), configurable through UMD_FETCH_WORKERS.
     """
+    if max_workers is None:
+        max_workers = fetch_concurrency(len(classrooms))
+    # Resolve today once so every classroom queries the same day, even across midnight
+    start_date = start_date or datetime.today().strftime("%Y-%m-%d")
+    # Each worker thread opens its own session on first use and keeps its connections for the whole run
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         future_to_classroom = {
             executor.submit(fetch_availability_for_classroom, classroom, start_date): classroom
@@ -194,7 +192,7 @@ def main():
     CampusBuilder.load_classrooms_from_json(buildings, "room_ids.json")
     
     # Gather all classrooms
-    all_classrooms = [classroom for building in buildings for classroom in building.classrooms]
+    all_classrooms = list(chain.from_iterable(building.classrooms for building in buildings))  # keep list for len()
     print(f"Total classrooms loaded: {len(all_classrooms)}")
     
     # Fetch availability data for all classrooms
@@ -207,10 +205,9 @@ def main():
     # Filter out buildings with no classrooms
     buildings_with_classrooms = [building for building in buildings if building.classrooms]
     
-    # Convert filtered buildings data to dictionary format and export to JSON
-    buildings_data = [building.to_dict() for building in buildings_with_classrooms]
-    with open("buildings_data.json", "w") as f:
-        json.dump(buildings_data, f, indent=4, default=str)
+    # Export filtered buildings to JSON, orjson serializes the dataclasses directly
+    with open("buildings_data.json", "wb") as f:
+        f.write(orjson.dumps(buildings_with_classrooms, option=orjson.OPT_INDENT_2))
     
     print("Building data with classrooms and availability has been exported to buildings_data.json")
 
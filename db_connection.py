@@ -0,0 +1,27 @@
+import sqlite3
+
+# Settings applied to every connection to the availability database
+PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-20000;
+    PRAGMA busy_timeout=5000;
+"""
+
+def connect(db_path, **kwargs):
+    """
+    Opens an SQLite connection tuned for one bulk writer alongside concurrent readers.
+
+    Parameters:
+        db_path (str): Path to the database file, or ":memory:".
+        **kwargs: Passed through to sqlite3.connect.
+
+    Returns:
+        sqlite3.Connection: Connection in WAL mode with relaxed fsyncs.
+    """
+    conn = sqlite3.connect(db_path, **kwargs)
+    # WAL needs a file on disk; in-memory databases keep their default journal
+    if db_path != ":memory:":
+        conn.execute("PRAGMA journal_mode=WAL;")
+    conn.executescript(PRAGMAS)
+    return conn
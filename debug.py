@@ -1,6 +1,16 @@
-import requests
 import pandas as pd
 from datetime import datetime
+from http_session import SESSION
+
+# 25live item fields and the CSV columns they are exported as
+COLUMN_NAMES = {
+    "item_date": "Date",
+    "itemName": "Event Name",
+    "start": "Time Start",
+    "end": "Time End",
+    "type_id": "Status",  # Possible status or type field
+    "itemId2": "Additional Details"
+}
 
 def fetch_single_room_availability(space_id, start_date=None, page_size=100):
     """
@@ -32,28 +42,24 @@ def fetch_single_room_availability(space_id, start_date=None, page_size=100):
         "caller": "pro-AvailService.getData"
     }
     
-    response = requests.get(url, params=params)
+    response = SESSION.get(url, params=params)
     
     if response.status_code == 200:
         data = response.json()
         print("Raw JSON Response:")
         print(data)
 
-        availability = []
-        for subject in data.get("subjects", []):
-            date = subject.get("item_date", "")
-            for item in subject.get("items", []):
-                availability.append({
-                    "Room ID": space_id,
-                    "Date": date,
-                    "Event Name": item.get("itemName", "N/A"),
-                    "Time Start": item.get("start", "N/A"),
-                    "Time End": item.get("end", "N/A"),
-                    "Status": item.get("type_id", "N/A"),  # Possible status or type field
-                    "Additional Details": item.get("itemId2", "N/A")
-                })
-
-        df = pd.DataFrame(availability)
+        # Flatten subjects -> items in one pass into rows of the exported fields, in COLUMN_NAMES order.
+        # Object columns keep IDs as ints; a numeric dtype would turn them into floats wherever an item lacks the field
+        records = [
+            (subject.get("item_date"), item.get("itemName"), item.get("start"), item.get("end"),
+             item.get("type_id"), item.get("itemId2"))
+            for subject in data.get("subjects", [])
+            for item in subject.get("items", [])
+        ]
+        df = pd.DataFrame(records, columns=list(COLUMN_NAMES), dtype=object).rename(columns=COLUMN_NAMES)
+        df = df.fillna({"Date": ""}).fillna("N/A")
+        df.insert(0, "Room ID", space_id)
         df.to_csv(f"single_room_{space_id}_availability.csv", index=False)
         print(f"Saved availability data to 'single_room_{space_id}_availability.csv'")
         print(df.head())
@@ -1,16 +1,48 @@
 import sqlite3
 
-def describe_database(db_path):
+def quote_identifier(name):
+    """
+    Quotes a table name for interpolation into SQL, so names with spaces or quotes don't break the query.
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+def estimate_row_counts(cursor):
+    """
+    Reads the row counts ANALYZE recorded in sqlite_stat1.
+
+    Returns:
+        dict: Table name -> estimated number of records. Empty if the database was never analyzed.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1';")
+    if cursor.fetchone() is None:
+        return {}
+
+    counts = {}
+    cursor.execute("SELECT tbl, stat FROM sqlite_stat1;")
+    for table_name, stat in cursor.fetchall():
+        # The first number of each stat entry is the number of rows in the table
+        if stat:
+            counts[table_name] = int(stat.split()[0])
+    return counts
+
+def describe_database(db_path, analyze=False):
     """
     Connects to the SQLite database at db_path and prints a description of its tables, including the number of records.
+
+    Record counts come from sqlite_stat1 when available, falling back to SELECT COUNT(*) for tables without statistics.
+    Pass analyze=True to refresh the statistics first (ANALYZE itself scans every table).
     """
     # Connect to the SQLite database
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
+    if analyze:
+        cursor.execute("ANALYZE;")
+
     # Get a list of all tables in the database
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
     tables = cursor.fetchall()
+    row_counts = estimate_row_counts(cursor)
 
     # Describe each table
     print("Database Description:\n")
@@ -18,13 +50,16 @@ def describe_database(db_path):
         table_name = table[0]
         print(f"Table: {table_name}")
 
-        # Get the number of records
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name};")
-        count = cursor.fetchone()[0]
-        print(f"Number of records: {count}")
+        # Get the number of records, only scanning tables ANALYZE has no statistics for
+        if table_name in row_counts:
+            print(f"Number of records (estimated): {row_counts[table_name]}")
+        else:
+            cursor.execute(f"SELECT COUNT(*) FROM {quote_identifier(table_name)};")
+            count = cursor.fetchone()[0]
+            print(f"Number of records: {count}")
 
         # Get column information for each table
-        cursor.execute(f"PRAGMA table_info({table_name});")
+        cursor.execute(f"PRAGMA table_info({quote_identifier(table_name)});")
         columns = cursor.fetchall()
 
         # Print column details
@@ -40,4 +75,4 @@ def describe_database(db_path):
     conn.close()
 
 
-describe_database("room_availability.db")
\ No newline at end of file
+describe_database("room_availability.db")
@@ -1,13 +1,31 @@
+import asyncio
+import httpx
 import json
-import requests
-from dataclasses import dataclass, asdict
+import orjson
+from dataclasses import dataclass, field
 from typing import List, Optional
+from collections import defaultdict
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from tqdm import tqdm
+from itertools import chain
+from tqdm.asyncio import tqdm
 import os  # Import os to check for file existence
+from http_session import chunked, fetch_concurrency
+from response_cache import CACHE
 
-@dataclass
+# Seconds a cached 25live availability response is reused before refetching
+AVAILABILITY_CACHE_TTL = 5 * 60
+
+AVAILABILITY_URL = "https://25live.collegenet.com/25live/data/umd/run/availability/availabilitydata.json"
+# Query parameters shared by every availability request; only the dates, page size and rooms vary
+BASE_AVAILABILITY_PARAMS = {
+    "obj_cache_accl": "0",
+    "comptype": "availability_daily",
+    "compsubject": "location",
+    "include": "closed blackouts pending related empty",
+    "caller": "pro-AvailService.getData"
+}
+
+@dataclass(slots=True)
 class Classroom:
     """Represents a classroom within a building"""
     id: int
@@ -16,21 +34,14 @@ class Classroom:
     capacity: Optional[int] = None
     has_whiteboard: bool = True
     has_projector: bool = True
-    availability_times: List[dict] = None
+    availability_times: List[dict] = field(default_factory=list)
     # Added building info to Classroom
     building_name: Optional[str] = None
     building_code: Optional[str] = None
     building_latitude: Optional[float] = None
     building_longitude: Optional[float] = None
 
-    def __post_init__(self):
-        if self.availability_times is None:
-            self.availability_times = []
-
-    def to_dict(self):
-        return asdict(self)
-
-@dataclass
+@dataclass(slots=True)
 class Building:
     """Represents a campus building with classrooms"""
     name: str
@@ -52,12 +63,6 @@ class Building:
             classrooms=[]
         )
 
-    def to_dict(self):
-        return {
-            **asdict(self),
-            "classrooms": [classroom.to_dict() for classroom in self.classrooms]
-        }
-
 def load_buildings(json_file: str) -> List[Building]:
     """Load buildings from JSON file"""
     try:
@@ -86,52 +91,36 @@ def load_classrooms_from_json(buildings: List[Building], json_file: str):
         # Process each room and add to appropriate building
         for room_data in rooms_data:
             # Extract building code from room name (e.g., "ESJ 0202" -> "ESJ")
-            room_parts = room_data["name"].split()
-            if len(room_parts) >= 2:
-                building_code = room_parts[0]
-                room_number = " ".join(room_parts[1:])
-
-                if building_code in building_map_code:
-                    building = building_map_code[building_code]
-                    classroom = Classroom(
-                        id=room_data["id"],
-                        name=room_data["name"],
-                        room_number=room_number,
-                        building_name=building.name,
-                        building_code=building.code,
-                        building_latitude=building.latitude,
-                        building_longitude=building.longitude,
-                    )
-                    building.classrooms.append(classroom)
-                else:
-                    # Try to use building name
-                    building_name = room_parts[0]  # Assuming first part is building name
-                    if building_name in building_map_name:
-                        building = building_map_name[building_name]
-                        classroom = Classroom(
-                            id=room_data["id"],
-                            name=room_data["name"],
-                            room_number=room_number,
-                            building_name=building.name,
-                            building_code=building.code,
-                            building_latitude=building.latitude,
-                            building_longitude=building.longitude,
-                        )
-                        building.classrooms.append(classroom)
-                    else:
-                        # Could not find building, collect the classroom separately
-                        unmatched_classrooms.append(Classroom(
-                            id=room_data["id"],
-                            name=room_data["name"],
-                            room_number=room_number
-                        ))
-            else:
+            building_code, sep, room_number = room_data["name"].partition(" ")
+            if not sep or not room_number:
                 # Could not parse room name, collect the classroom separately
                 unmatched_classrooms.append(Classroom(
                     id=room_data["id"],
                     name=room_data["name"],
                     room_number=""
                 ))
+                continue
+
+            # Fall back to treating the first part as the building name
+            building = building_map_code.get(building_code) or building_map_name.get(building_code)
+            if building is None:
+                # Could not find building, collect the classroom separately
+                unmatched_classrooms.append(Classroom(
+                    id=room_data["id"],
+                    name=room_data["name"],
+                    room_number=room_number
+                ))
+                continue
+
+            building.classrooms.append(Classroom(
+                id=room_data["id"],
+                name=room_data["name"],
+                room_number=room_number,
+                building_name=building.name,
+                building_code=building.code,
+                building_latitude=building.latitude,
+                building_longitude=building.longitude,
+            ))
         return unmatched_classrooms
 
     except FileNotFoundError:
@@ -141,87 +130,159 @@ def load_classrooms_from_json(buildings: List[Building], json_file: str):
         print(f"Error: Invalid JSON in {json_file}")
         return []
 
-def fetch_availability_for_classroom(classroom, start_date=None, page_size=100):
+async def fetch_availability_data(client, url, params, fallback=None):
+    """
+    Requests availability data from 25live and caches the decoded response.
+    If the request fails and a stale cached response is given as fallback, that is returned instead.
+    """
+    try:
+        response = await client.get(url, params=params, timeout=10)  # Added timeout for robustness
+        response.raise_for_status()  # Raises HTTPStatusError for bad responses
+        data = orjson.loads(response.content)
+    except httpx.HTTPError:
+        if fallback is None:
+            raise
+        return fallback
+
+    CACHE.set(url, params, data)
+    return data
+
+def group_availability(subjects):
+    """
+    Groups 25live availability items by date, time_start, and time_end, combining event names.
+    """
+    # Group events by date, time_start, and time_end; the first item of a slot sets its status
+    names = defaultdict(list)
+    details = defaultdict(list)
+    status = {}
+    for subject in subjects:
+        date = subject.get("item_date", "")
+        for item in subject.get("items", ()):
+            key = (date, item.get("start", "N/A"), item.get("end", "N/A"))
+            names[key].append(item.get("itemName", "N/A"))
+            details[key].append(str(item.get("itemId2", "N/A")))
+            status.setdefault(key, item.get("type_id", "N/A"))
+
+    # Materialize the grouped slots once, combining event names
+    return [
+        {
+            "date": key[0],
+            "event_name": ', '.join(event_names),
+            "time_start": key[1],
+            "time_end": key[2],
+            "status": status[key],
+            "additional_details": ', '.join(details[key])
+        }
+        for key, event_names in names.items()
+    ]
+
+async def fetch_one_at_a_time(client, classrooms_batch, start_date, page_size=100):
+    """
+    Requests each classroom of a batch on its own.
+    """
+    await asyncio.gather(*(
+        fetch_availability_batch(client, [classroom], start_date, page_size) for classroom in classrooms_batch
+    ))
+
+async def fetch_availability_batch(client, classrooms_batch, start_date=None, page_size=100):
     """
-    Fetches room availability data for a specified classroom and updates its availability_times.
+    Fetches room availability data for a batch of classrooms in a single request and updates their availability_times.
+
+    If 25live rejects a multi-room request with an error status, or its response can't be routed back to the
+    batch (a subject names no requested room, or a room gets no subjects at all), the batch is requested again
+    one classroom at a time rather than exported as empty.
     """
     if start_date is None:
         start_date = datetime.today().strftime("%Y-%m-%d")
         
     start_datetime = f"{start_date}T00:00:00"
     
-    url = "https://25live.collegenet.com/25live/data/umd/run/availability/availabilitydata.json"
+    url = AVAILABILITY_URL
     params = {
-        "obj_cache_accl": "0",
+        **BASE_AVAILABILITY_PARAMS,
         "start_dt": start_datetime,
-        "comptype": "availability_daily",
-        "compsubject": "location",
-        "page_size": str(page_size),
-        "space_id": str(classroom.id),
-        "include": "closed blackouts pending related empty",
-        "caller": "pro-AvailService.getData"
+        "page_size": str(page_size * len(classrooms_batch)),
+        # 25live takes multiple values as a space separated list
+        "space_id": " ".join(str(classroom.id) for classroom in classrooms_batch)
     }
+    classroom_ids = [classroom.id for classroom in classrooms_batch]
     
     try:
-        response = requests.get(url, params=params, timeout=10)  # Added timeout for robustness
-        response.raise_for_status()  # Raises HTTPError for bad responses
-        data = response.json()
+        data, fresh = CACHE.get(url, params, AVAILABILITY_CACHE_TTL)
+        if not fresh:
+            data = await fetch_availability_data(client, url, params, fallback=data)
 
-        # Use a dictionary to group events by date, time_start, and time_end
-        availability_dict = {}
+        # Dispatch each subject back to the classroom it describes
+        classroom_map = {str(classroom.id): classroom for classroom in classrooms_batch}
+        subjects_by_classroom = {classroom.id: [] for classroom in classrooms_batch}
+        unmatched = []
         for subject in data.get("subjects", []):
-            date = subject.get("item_date", "")
-            for item in subject.get("items", []):
-                time_start = item.get("start", "N/A")
-                time_end = item.get("end", "N/A")
-                key = (date, time_start, time_end)
-                if key not in availability_dict:
-                    availability_dict[key] = {
-                        "date": date,
-                        "event_name": [item.get("itemName", "N/A")],
-                        "time_start": time_start,
-                        "time_end": time_end,
-                        "status": item.get("type_id", "N/A"),  
-                        "additional_details": [item.get("itemId2", "N/A")]
-                    }
-                else:
-                    availability_dict[key]["event_name"].append(item.get("itemName", "N/A"))
-                    availability_dict[key]["additional_details"].append(item.get("itemId2", "N/A"))
-        
-        # Convert the grouped data back into a list and combine event names
-        availability = []
-        for entry in availability_dict.values():
-            entry["event_name"] = ', '.join(entry["event_name"])
-            entry["additional_details"] = ', '.join(map(str, entry["additional_details"]))
-            availability.append(entry)
-        
-        classroom.availability_times = availability
+            classroom = classroom_map.get(str(subject.get("itemId")))
+            if classroom is None and len(classrooms_batch) == 1:
+                classroom = classrooms_batch[0]
+            if classroom is not None:
+                subjects_by_classroom[classroom.id].append(subject)
+            else:
+                unmatched.append(subject.get("itemId"))
 
-    except requests.exceptions.RequestException as e:
-        print(f"Request error for classroom {classroom.id}: {e}")
-        classroom.availability_times = []
+        missing = [classroom_id for classroom_id, subjects in subjects_by_classroom.items() if not subjects]
+        if len(classrooms_batch) > 1 and (unmatched or missing):
+            print(f"Could not route batch {classroom_ids} (unmatched subjects {unmatched}, rooms without subjects {missing}), "
+                  f"requesting its classrooms one at a time")
+            await fetch_one_at_a_time(client, classrooms_batch, start_date, page_size)
+            return
+
+        for classroom in classrooms_batch:
+            classroom.availability_times = group_availability(subjects_by_classroom[classroom.id])
+
+    except httpx.HTTPStatusError as e:
+        if len(classrooms_batch) > 1:
+            print(f"Batch request for classrooms {classroom_ids} failed with status {e.response.status_code}, "
+                  f"requesting its classrooms one at a time")
+            await fetch_one_at_a_time(client, classrooms_batch, start_date, page_size)
+            return
+        print(f"Request error for classrooms {classroom_ids}: {e!r}")
+        for classroom in classrooms_batch:
+            classroom.availability_times = []
+    except httpx.HTTPError as e:
+        print(f"Request error for classrooms {classroom_ids}: {e!r}")
+        for classroom in classrooms_batch:
+            classroom.availability_times = []
     except json.JSONDecodeError:
-        print(f"JSON decode error for classroom {classroom.id}")
-        classroom.availability_times = []
+        print(f"JSON decode error for classrooms {classroom_ids}")
+        for classroom in classrooms_batch:
+            classroom.availability_times = []
     except Exception as e:
-        print(f"Unexpected error for classroom {classroom.id}: {e}")
-        classroom.availability_times = []
+        print(f"Unexpected error for classrooms {classroom_ids}: {e}")
+        for classroom in classrooms_batch:
+            classroom.availability_times = []
 
-def fetch_availability_for_all_classrooms(classrooms, start_date=None, max_workers=50):
+async def fetch_availability_for_all_classrooms(classrooms, start_date=None, batch_size=20, max_concurrency=None):
     """
-    Fetches availability data for multiple classrooms using multithreading.
+    Fetches availability data for multiple classrooms concurrently, batch_size classrooms per request.
+    max_concurrency defaults to fetch_concurrency(), configurable through UMD_FETCH_WORKERS.
     """
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_classroom = {
-            executor.submit(fetch_availability_for_classroom, classroom, start_date): classroom
-            for classroom in classrooms
-        }
-        for future in tqdm(as_completed(future_to_classroom), total=len(future_to_classroom), desc="Fetching classroom availability"):
-            classroom = future_to_classroom[future]
+    # Resolve today once so every batch queries the same day, even across midnight
+    start_date = start_date or datetime.today().strftime("%Y-%m-%d")
+    batches = list(chunked(classrooms, batch_size))
+    if max_concurrency is None:
+        max_concurrency = fetch_concurrency(len(batches))
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(client, classrooms_batch):
+        async with semaphore:
+            await fetch_availability_batch(client, classrooms_batch, start_date)
+        return classrooms_batch
+
+    # HTTP/2 multiplexes concurrent requests over a handful of connections to 25live
+    limits = httpx.Limits(max_keepalive_connections=max_concurrency, max_connections=max_concurrency)
+    async with httpx.AsyncClient(http2=True, limits=limits) as client:
+        tasks = [bounded(client, classrooms_batch) for classrooms_batch in batches]
+        for task in tqdm.as_completed(tasks, total=len(tasks), desc="Fetching classroom availability"):
             try:
-                future.result()
+                await task
             except Exception as e:
-                print(f"Error fetching data for classroom {classroom.id}: {e}")
+                print(f"Error fetching classroom availability: {e}")
 
 def main():
     # Load buildings from JSON file
@@ -232,15 +293,15 @@ def main():
     unmatched_classrooms = load_classrooms_from_json(buildings, "room_ids.json")
     
     # Gather all classrooms
-    all_classrooms = [classroom for building in buildings for classroom in building.classrooms]
-    total_classrooms = len(all_classrooms) + len(unmatched_classrooms)
+    all_classrooms = chain.from_iterable(building.classrooms for building in buildings)
+    total_classrooms = sum(len(building.classrooms) for building in buildings) + len(unmatched_classrooms)
     print(f"Total classrooms loaded: {total_classrooms}")
     
     # Fetch availability data for all classrooms
     if total_classrooms:
         print(f"Fetching availability data for {total_classrooms} classrooms")
         # Fetch availability for classrooms associated with buildings
-        fetch_availability_for_all_classrooms(all_classrooms + unmatched_classrooms)
+        asyncio.run(fetch_availability_for_all_classrooms(chain(all_classrooms, unmatched_classrooms)))
     else:
         print("No classrooms found to fetch availability data.")
     
@@ -302,11 +363,10 @@ def main():
             print(f"Error reading labeled unmatched classrooms: {e}")
     else:
         # If no labeled classrooms file, create one for labeling
-        unmatched_classrooms_data = [classroom.to_dict() for classroom in unmatched_classrooms]
-        if unmatched_classrooms_data:
+        if unmatched_classrooms:
             # Create a file for the user to label unmatched classrooms
-            with open("unmatched_classrooms_to_label.json", "w") as f:
-                json.dump(unmatched_classrooms_data, f, indent=4, default=str)
+            with open("unmatched_classrooms_to_label.json", "wb") as f:
+                f.write(orjson.dumps(unmatched_classrooms, option=orjson.OPT_INDENT_2))
             print("Unmatched classrooms have been exported to unmatched_classrooms_to_label.json for labeling.")
             
             # Prompt the user to label the unmatched classrooms
@@ -347,8 +407,8 @@ def main():
                         print(f"Discarding classroom {data.get('id')} due to incomplete labeling.")
                 
                 # Save labeled unmatched classrooms for future runs
-                with open(labeled_classrooms_file, "w") as f:
-                    json.dump([c.to_dict() for c in labeled_unmatched_classrooms], f, indent=4, default=str)
+                with open(labeled_classrooms_file, "wb") as f:
+                    f.write(orjson.dumps(labeled_unmatched_classrooms, option=orjson.OPT_INDENT_2))
                 
                 # Group classrooms by building code or name
                 for classroom in labeled_unmatched_classrooms:
@@ -385,10 +445,9 @@ def main():
     # Filter out buildings with no classrooms
     buildings_with_classrooms = [building for building in buildings if building.classrooms]
     
-    # Convert buildings data to dictionary format and export to JSON
-    buildings_data = [building.to_dict() for building in buildings_with_classrooms]
-    with open("buildings_data.json", "w") as f:
-        json.dump(buildings_data, f, indent=4, default=str)
+    # Export buildings to JSON, orjson serializes the dataclasses directly
+    with open("buildings_data.json", "wb") as f:
+        f.write(orjson.dumps(buildings_with_classrooms, option=orjson.OPT_INDENT_2))
     
     print("Building data with classrooms and availability has been exported to buildings_data.json")
 
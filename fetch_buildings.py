@@ -1,7 +1,8 @@
-import json
+import orjson
 import requests
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from typing import List, Optional
+from http_session import get_json
 
 @dataclass
 class Building:
@@ -23,15 +24,10 @@ class Building:
             longitude=float(api_data.get('long', 0)),
         )
 
-    def to_dict(self):
-        return asdict(self)
-
 def fetch_buildings():
     BUILDINGS_API_URL = "https://api.umd.io/v1/map/buildings"
     try:
-        response = requests.get(BUILDINGS_API_URL)
-        response.raise_for_status()
-        buildings_data = response.json()
+        buildings_data = get_json(BUILDINGS_API_URL)
 
         # Create Building objects from API data
         buildings = [Building.from_api_data(b_data) for b_data in buildings_data]
@@ -45,10 +41,9 @@ def main():
     buildings = fetch_buildings()
     print(f"Fetched {len(buildings)} buildings from API")
 
-    # Save buildings to JSON file
-    buildings_data = [building.to_dict() for building in buildings]
-    with open("buildings.json", "w") as f:
-        json.dump(buildings_data, f, indent=4, default=str)
+    # Save buildings to JSON file, orjson serializes the dataclasses directly
+    with open("buildings.json", "wb") as f:
+        f.write(orjson.dumps(buildings, option=orjson.OPT_INDENT_2))
 
     print("Building data has been exported to buildings.json")
 
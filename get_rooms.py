@@ -1,5 +1,6 @@
-import requests
 import json
+import requests
+from http_session import get_json
 
 def fetch_all_room_ids():
     # API endpoint to get all rooms
@@ -15,32 +16,31 @@ def fetch_all_room_ids():
         "caller": "pro-ListService.getData"
     }
 
-    # Send the request to the API
-    response = requests.get(url, params=params)
-    
-    # Check if the response is successful
-    if response.status_code == 200:
-        data = response.json()  # Parse JSON data
-        print("Raw JSON Response:")
-        print(data)  # Uncomment to inspect the structure if needed
+    # Send the request to the API (served from the cache if fetched within the last day)
+    try:
+        data = get_json(url, params=params)  # Parse JSON data
+    except requests.RequestException as e:
+        print(f"Failed to retrieve data: {e}")
+        return
 
-        # Extract room IDs
-        room_ids = []
-        for row_entry in data.get("rows", []):
-            for room in row_entry.get("row", []):
-                if isinstance(room, dict):  # Check if 'room' is a dictionary
-                    room_id = room.get("itemId")
-                    room_name = room.get("itemName")
-                    if room_id:
-                        room_ids.append({"id": room_id, "name": room_name})
-        
-        # Save room IDs to a JSON file
-        with open("room_ids.json", "w") as f:
-            json.dump(room_ids, f)
-        
-        print(f"Saved {len(room_ids)} room IDs to 'room_ids.json'")
-    else:
-        print(f"Failed to retrieve data. Status code: {response.status_code}")
+    print("Raw JSON Response:")
+    print(data)  # Uncomment to inspect the structure if needed
+
+    # Extract room IDs
+    room_ids = []
+    for row_entry in data.get("rows", []):
+        for room in row_entry.get("row", []):
+            if isinstance(room, dict):  # Check if 'room' is a dictionary
+                room_id = room.get("itemId")
+                room_name = room.get("itemName")
+                if room_id:
+                    room_ids.append({"id": room_id, "name": room_name})
+    
+    # Save room IDs to a JSON file
+    with open("room_ids.json", "w") as f:
+        json.dump(room_ids, f)
+    
+    print(f"Saved {len(room_ids)} room IDs to 'room_ids.json'")
 
 # Run the function
 fetch_all_room_ids()
@@ -0,0 +1,106 @@
+import os
+import requests
+import threading
+from itertools import islice
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from response_cache import CACHE
+
+def make_session(pool_connections=32, pool_maxsize=64):
+    """
+    Creates a requests.Session that keeps connections to api.umd.io and 25live alive between calls.
+
+    Parameters:
+        pool_connections (int): Number of per-host connection pools to cache.
+        pool_maxsize (int): Maximum number of connections kept open per host.
+
+    Returns:
+        requests.Session: Session with a pooled, retrying HTTPS adapter mounted.
+    """
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    session.mount("https://", HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retries
+    ))
+    return session
+
+# Shared session for sequential calls
+SESSION = make_session()
+
+_local = threading.local()
+
+def thread_session():
+    """
+    Returns a session owned by the calling thread, created on its first call.
+
+    requests.Session isn't thread-safe, so worker threads each keep their own and reuse its
+    keep-alive connections for every request they make. One thread has one request in flight,
+    so a small pool per host is enough.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = make_session(pool_connections=4, pool_maxsize=4)
+    return session
+
+def fetch_concurrency(n_tasks):
+    """
+    Picks how many requests to keep in flight against one host.
+
+    The UMD_FETCH_WORKERS environment variable overrides the default and is clamped to [4, 64].
+    Otherwise, or if it isn't an integer, min(32, n_tasks) is used, matching the ThreadPoolExecutor default.
+    """
+    workers = max(min(32, n_tasks), 1)
+    override = os.getenv("UMD_FETCH_WORKERS")
+    if override:
+        try:
+            workers = min(max(int(override), 4), 64)
+        except ValueError:
+            print(f"Warning: ignoring UMD_FETCH_WORKERS={override!r}, it is not an integer")
+    print(f"Using {workers} concurrent requests")
+    return workers
+
+def chunked(iterable, size):
+    """
+    Splits an iterable into lists of at most size items, e.g. room ids into one batch per request.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+ONE_DAY = 24 * 60 * 60
+
+def get_json(url, params=None, ttl=ONE_DAY, session=SESSION, cache_fallback=True, **kwargs):
+    """
+    Issues a cached GET request and returns the decoded JSON body.
+
+    Parameters:
+        url (str): Request URL.
+        params (dict): Query parameters.
+        ttl (float): Seconds a cached response is served without hitting the network. Default is one day.
+        session (requests.Session): Session used on a cache miss. Defaults to the shared SESSION.
+        cache_fallback (bool): Return the last stale response instead of raising when the request fails.
+
+    Returns:
+        Decoded JSON data.
+
+    Raises:
+        requests.RequestException: If the request fails and no cached response can be used.
+    """
+    cached, fresh = CACHE.get(url, params, ttl)
+    if fresh:
+        return cached
+
+    try:
+        response = session.get(url, params=params, **kwargs)
+        response.raise_for_status()
+        data = response.json()
+    except requests.RequestException as e:
+        if cache_fallback and cached is not None:
+            print(f"Request to {url} failed ({e}), using cached response")
+            return cached
+        raise
+
+    CACHE.set(url, params, data)
+    return data
@@ -1,39 +1,55 @@
 import json
+import orjson
+from collections import deque
+from pathlib import Path
+
+# Type names for the values JSON decodes to, looked up once per node instead of via type().__name__
+_TYPENAMES = {dict: 'dict', list: 'list', str: 'str', int: 'int', float: 'float', bool: 'bool', type(None): 'NoneType'}
+
+def _type_name(value):
+    value_type = type(value)
+    return _TYPENAMES.get(value_type) or value_type.__name__
 
 def analyze_json(data, level=0):
     """
-    Recursively analyze the JSON structure and print details about each key and data type.
+    Analyze the JSON structure depth-first and print details about each key and data type.
+    Uses an explicit stack rather than recursion, so deeply nested data cannot hit the recursion limit.
     
     Parameters:
         data (dict or list): JSON data to analyze.
-        level (int): Current level of nesting for pretty-printing.
+        level (int): Starting level of nesting for pretty-printing.
     """
-    indent = "  " * level  # indentation for pretty-printing
-    
-    if isinstance(data, dict):
-        for key, value in data.items():
-            print(f"{indent}Key: '{key}' - Type: {type(value).__name__}")
-            analyze_json(value, level + 1)
-    elif isinstance(data, list):
-        print(f"{indent}List of {len(data)} items - Type of items: {type(data[0]).__name__ if data else 'Unknown'}")
-        for item in data[:1]:  # analyze only the first item for simplicity
-            analyze_json(item, level + 1)
-    else:
-        print(f"{indent}Value: '{data}' - Type: {type(data).__name__}")
+    # Each entry is (key, value, level); key is None for values that are not under a dict key
+    stack = deque([(None, data, level)])
+    while stack:
+        key, value, level = stack.pop()
+        indent = "  " * level  # indentation for pretty-printing
+
+        if key is not None:
+            print(f"{indent}Key: '{key}' - Type: {_type_name(value)}")
+            stack.append((None, value, level + 1))
+        elif isinstance(value, dict):
+            # Push in reverse so keys are printed in their original order
+            stack.extend((child_key, child, level) for child_key, child in reversed(value.items()))
+        elif isinstance(value, list):
+            print(f"{indent}List of {len(value)} items - Type of items: {_type_name(value[0]) if value else 'Unknown'}")
+            if value:  # analyze only the first item for simplicity
+                stack.append((None, value[0], level + 1))
+        else:
+            print(f"{indent}Value: '{value}' - Type: {_type_name(value)}")
 
 def main():
     # Load JSON data from 'buildings_data.json'
     try:
-        with open('buildings_data.json', 'r') as file:
-            data = json.load(file)
+        data = orjson.loads(Path('buildings_data.json').read_bytes())
         
         print("JSON Structure and Layout Analysis:\n")
         analyze_json(data)
     
     except FileNotFoundError:
-        print("The file 'buildins_info.json' was not found.")
+        print("The file 'buildings_data.json' was not found.")
     except json.JSONDecodeError:
-        print("The file 'buildins_info.json' is not a valid JSON file.")
+        print("The file 'buildings_data.json' is not a valid JSON file.")
 
 if __name__ == "__main__":
     main()
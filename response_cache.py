@@ -0,0 +1,118 @@
+import orjson
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+# Bumped whenever the responses table changes; older caches are simply discarded
+SCHEMA_VERSION = 1
+
+# Entries older than this are deleted when the cache is opened. Every new start date is a new key,
+# so without a bound the file grows on every run. A week keeps stale fallbacks across the weekly schedule.
+MAX_AGE = 7 * 24 * 60 * 60
+
+class ResponseCache:
+    """SQLite-backed store of decoded JSON responses keyed on URL and query parameters"""
+
+    def __init__(self, path="cache.sqlite", max_age=MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Opened lazily so importing a script never creates the cache file
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS responses")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    stored_at REAL,
+                    body BLOB,
+                    etag TEXT,
+                    last_modified TEXT
+                )
+            """)
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            # Freed pages are reused by later entries, so the file stops growing once old keys age out
+            self._conn.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - self.max_age,))
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(url, params=None):
+        """Builds a stable key regardless of the order the params were given in"""
+        return f"{url}?{urlencode(sorted((params or {}).items()))}"
+
+    def get(self, url, params=None, ttl=600, raw=False):
+        """
+        Looks up a cached response.
+
+        Parameters:
+            url (str): Request URL.
+            params (dict): Query parameters of the request.
+            ttl (float): Seconds an entry stays fresh.
+            raw (bool): Return the stored JSON bytes instead of decoding them.
+
+        Returns:
+            tuple: (data, is_fresh). data is None if nothing was cached.
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT stored_at, body FROM responses WHERE key = ?",
+                (self.make_key(url, params),)
+            ).fetchone()
+        if row is None:
+            return None, False
+        stored_at, body = row
+        return body if raw else orjson.loads(body), time.time() - stored_at < ttl
+
+    def conditional_headers(self, url, params=None):
+        """
+        Builds If-None-Match / If-Modified-Since headers from the validators stored with a cached response.
+
+        Returns:
+            dict: Headers for a conditional GET. Empty if nothing was cached or the server sent no validators.
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT etag, last_modified FROM responses WHERE key = ?",
+                (self.make_key(url, params),)
+            ).fetchone()
+        headers = {}
+        if row is not None:
+            etag, last_modified = row
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def set(self, url, params, data, etag=None, last_modified=None):
+        """Stores the decoded response for url and params, with the ETag and Last-Modified headers it came with"""
+        self.set_body(url, params, orjson.dumps(data), etag, last_modified)
+
+    def set_body(self, url, params, body, etag=None, last_modified=None):
+        """Like set, but takes the response's JSON bytes as they came off the wire"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, stored_at, body, etag, last_modified) VALUES (?, ?, ?, ?, ?)",
+                (self.make_key(url, params), time.time(), body, etag, last_modified)
+            )
+            conn.commit()
+
+    def touch(self, url, params=None):
+        """Marks a cached response as fresh again, after the server answered 304 Not Modified"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE responses SET stored_at = ? WHERE key = ?",
+                (time.time(), self.make_key(url, params))
+            )
+            conn.commit()
+
+# Shared cache used by every fetcher
+CACHE = ResponseCache()
@@ -1,127 +1,431 @@
-import requests
+import asyncio
+import httpx
+import logging
+import logging.handlers
+import queue
+import threading
+import orjson
+import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import sqlite3
+from urllib.parse import urlencode
 import json
-from tqdm import tqdm  # Import tqdm for progress bar
+from tqdm.asyncio import tqdm  # Import tqdm for progress bar
+from db_connection import connect
+from http_session import chunked
+from response_cache import CACHE
 
-def fetch_single_room_availability(space_id, start_date=None, page_size=100):
+log = logging.getLogger("scrape")
+
+class RepeatFilter(logging.Filter):
+    """Lets the first `limit` records of each message through and only counts the rest"""
+
+    def __init__(self, limit=10):
+        super().__init__()
+        self.limit = limit
+        self.counts = Counter()
+
+    def filter(self, record):
+        # Keyed on the unformatted message, so "Request error for room %s" counts once for every room
+        self.counts[record.msg] += 1
+        return self.counts[record.msg] <= self.limit
+
+    def suppressed(self):
+        """Returns message -> number of records that were dropped"""
+        return {msg: count - self.limit for msg, count in self.counts.items() if count > self.limit}
+
+def start_logging(level=logging.WARNING, repeat_limit=10):
+    """
+    Sends the scrape logger's records through a queue that a background thread writes to stderr,
+    so a burst of request errors never waits on the terminal.
+
+    Returns:
+        tuple: (QueueListener, RepeatFilter) to pass to stop_logging.
     """
-    Fetches room availability data for a specified room (space_id) and start date.
+    records = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(records)
+    repeat_filter = RepeatFilter(repeat_limit)
+    handler.addFilter(repeat_filter)
+    log.addHandler(handler)
+    log.setLevel(level)
+    log.propagate = False
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+    listener = logging.handlers.QueueListener(records, stream_handler)
+    listener.start()
+    return listener, repeat_filter
+
+def stop_logging(listener, repeat_filter):
+    """Flushes the queued records and reports how many repeats were suppressed"""
+    listener.stop()
+    for msg, count in repeat_filter.suppressed().items():
+        print(f"Suppressed {count} more messages like: {msg}")
+
+DB_PATH = "room_availability.db"
+
+# Columns of the room_availability table, in insert order
+COLUMNS = ["room_id", "date", "event_name", "time_start", "time_end", "status", "additional_details"]
+
+AVAILABILITY_URL = "https://25live.collegenet.com/25live/data/umd/run/availability/availabilitydata.json"
+# Query parameters shared by every room, percent-encoded once instead of on every request
+_BASE_QS = urlencode({
+    "obj_cache_accl": "0",
+    "comptype": "availability_daily",
+    "compsubject": "location",
+    "include": "closed blackouts pending related empty",
+    "caller": "pro-AvailService.getData"
+})
+
+# Responses worth retrying with exponential backoff; any other 4xx fails the batch immediately
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 2
+BACKOFF_FACTOR = 0.3
+# Bounds how long a stalled 25live request can hold one of the concurrency slots
+REQUEST_TIMEOUT = httpx.Timeout(7, connect=3.05)
+
+# Smaller bodies decode faster inline than the round trip to a worker process takes
+POOL_MIN_BODY_BYTES = 1_000_000
+
+# Seconds a cached availability response is used without asking 25live; after that it is revalidated
+AVAILABILITY_CACHE_TTL = 5 * 60
+
+# Every scrape also leaves a columnar copy of its rows at snapshots/<start date>/availability.parquet
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_SCHEMA = pa.schema([
+    ("room_id", pa.int64()),
+    ("date", pa.string()),
+    ("event_name", pa.string()),
+    ("time_start", pa.float64()),
+    ("time_end", pa.float64()),
+    ("status", pa.int64()),
+    ("additional_details", pa.string())
+])
+
+# Rows buffered by the writer before each transaction
+FLUSH_ROWS = 10_000
+# Batches whose rows can be waiting for the writer at once
+QUEUE_MAXSIZE = 100
+
+def extract_rows(subjects, space_id):
+    """
+    Flattens the subjects of a decoded 25live availability response into rows in COLUMNS order.
 
     Parameters:
-        space_id (int): Unique ID of the room.
+        subjects (list of dict): Subjects (one per day) describing the room.
+        space_id (int): Room the subjects belong to.
+
+    Returns:
+        list of tuple: One row per booking. Fields missing from an item are None, which is stored as NULL.
+    """
+    return [
+        (
+            space_id,
+            subject.get("item_date", ""),
+            item.get("itemName"),
+            item.get("start"),
+            item.get("end"),
+            item.get("type_id"),
+            item.get("itemId2")
+        )
+        for subject in subjects
+        for item in subject.get("items", [])
+    ]
+
+def parse_batch(body, space_ids):
+    """
+    Decodes a batch response and flattens it into rows, routing each subject to its room by itemId.
+
+    Kept at module level and free of logging so it can run in a ProcessPoolExecutor worker.
+
+    Parameters:
+        body (bytes): availabilitydata.json response body.
+        space_ids (list of int): Rooms the batch was requested for.
+
+    Returns:
+        tuple: (rows, unmatched, missing). rows are in COLUMNS order; unmatched lists the itemIds of subjects
+        that belong to none of space_ids, and missing the rooms that received no subjects at all.
+    """
+    data = orjson.loads(body)
+
+    subjects_by_room = {str(room_id): [] for room_id in space_ids}
+    unmatched = []
+    for subject in data.get("subjects", []):
+        room_subjects = subjects_by_room.get(str(subject.get("itemId")))
+        if room_subjects is None and len(space_ids) == 1:
+            room_subjects = subjects_by_room[str(space_ids[0])]
+        if room_subjects is not None:
+            room_subjects.append(subject)
+        else:
+            unmatched.append(subject.get("itemId"))
+
+    rows = []
+    missing = []
+    for room_id in space_ids:
+        subjects = subjects_by_room[str(room_id)]
+        if not subjects:
+            missing.append(room_id)
+        rows.extend(extract_rows(subjects, room_id))
+    return rows, unmatched, missing
+
+async def get_with_retries(client, url, headers=None):
+    """
+    Issues a GET request, retrying transport errors and RETRY_STATUSES responses up to MAX_RETRIES times.
+    Waits BACKOFF_FACTOR * 2 ** attempt seconds between attempts.
+
+    Returns:
+        httpx.Response: The first response that shouldn't be retried, or the last one.
+
+    Raises:
+        httpx.TransportError: If the last attempt fails to get a response at all.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = await client.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        except httpx.TransportError:
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return response
+        await asyncio.sleep(BACKOFF_FACTOR * 2 ** attempt)
+
+async def fetch_rooms_one_at_a_time(client, space_ids, start_date, page_size=100, executor=None):
+    """
+    Requests each room of a batch on its own and combines the results the way fetch_room_batch returns them.
+    """
+    results = await asyncio.gather(*(
+        fetch_room_batch(client, [room_id], start_date, page_size, executor) for room_id in space_ids
+    ))
+    return (
+        [room_id for fetched, _ in results for room_id in fetched],
+        [row for _, room_rows in results for row in room_rows]
+    )
+
+async def fetch_room_batch(client, space_ids, start_date=None, page_size=100, executor=None):
+    """
+    Fetches room availability data for several rooms (space_ids) and a start date in a single request.
+
+    If 25live rejects a multi-room request with an error status, or the response can't be routed back to the
+    batch (a subject names no requested room, or a room gets no subjects at all), the rooms are requested
+    again one at a time instead of being dropped.
+
+    Responses are cached for AVAILABILITY_CACHE_TTL seconds. Older entries are revalidated with a conditional
+    GET, so a room whose data didn't change costs a 304 with no body.
+
+    Parameters:
+        client (httpx.AsyncClient): Shared client used to issue the request.
+        space_ids (list of int): Unique IDs of the rooms.
         start_date (str): Start date in YYYY-MM-DD format. Defaults to today's date if None.
-        page_size (int): Number of entries per page. Default is 100.
+        page_size (int): Number of entries per page and room. Default is 100.
+        executor (concurrent.futures.Executor): Pool that decodes responses of at least POOL_MIN_BODY_BYTES.
+            Everything is decoded inline if None.
 
     Returns:
-        list of dict: Availability data for the room.
+        tuple: (fetched, rows). fetched lists the rooms whose availability was retrieved, empty if the request
+        failed; rows are their availability rows, in COLUMNS order.
     """
     if start_date is None:
         start_date = datetime.today().strftime("%Y-%m-%d")
         
-    start_datetime = f"{start_date}T00:00:00"
-    
-    url = "https://25live.collegenet.com/25live/data/umd/run/availability/availabilitydata.json"
-    params = {
-        "obj_cache_accl": "0",
-        "start_dt": start_datetime,
-        "comptype": "availability_daily",
-        "compsubject": "location",
-        "page_size": str(page_size),
-        "space_id": str(space_id),
-        "include": "closed blackouts pending related empty",
-        "caller": "pro-AvailService.getData"
-    }
+    # Only the per-batch values are formatted here; the rest of the query string is prebuilt.
+    # 25live takes multiple rooms as a space separated list, encoded as "+"
+    space_id = "+".join(str(room_id) for room_id in space_ids)
+    url = f"{AVAILABILITY_URL}?{_BASE_QS}&start_dt={start_date}T00:00:00&page_size={page_size * len(space_ids)}&space_id={space_id}"
     
     try:
-        response = requests.get(url, params=params, timeout=10)  # Added timeout for robustness
-        response.raise_for_status()  # Raises HTTPError for bad responses
-        data = response.json()
-        availability = []
-        for subject in data.get("subjects", []):
-            date = subject.get("item_date", "")
-            for item in subject.get("items", []):
-                availability.append({
-                    "room_id": space_id,
-                    "date": date,
-                    "event_name": item.get("itemName", "N/A"),
-                    "time_start": item.get("start", "N/A"),
-                    "time_end": item.get("end", "N/A"),
-                    "status": item.get("type_id", "N/A"),  
-                    "additional_details": item.get("itemId2", "N/A")
-                })
-        return availability
-    except requests.exceptions.RequestException as e:
-        print(f"Request error for room {space_id}: {e}")
-        return []
+        # The cache hands back the JSON bytes so decoding happens in one place, possibly another process
+        cached, fresh = CACHE.get(url, ttl=AVAILABILITY_CACHE_TTL, raw=True)
+        response = None
+        if fresh:
+            body = cached
+        else:
+            headers = CACHE.conditional_headers(url) if cached is not None else {}
+            response = await get_with_retries(client, url, headers)
+            if response.status_code == 304 and cached is not None:
+                CACHE.touch(url)
+                body = cached
+            else:
+                response.raise_for_status()  # Raises HTTPStatusError for bad responses
+                body = response.content
+
+        if executor is None or len(body) < POOL_MIN_BODY_BYTES:
+            rows, unmatched, missing = parse_batch(body, space_ids)
+        else:
+            rows, unmatched, missing = await asyncio.get_running_loop().run_in_executor(
+                executor, parse_batch, body, space_ids
+            )
+
+        # A single room keeps every subject, so this always resolves after one level
+        if len(space_ids) > 1 and (unmatched or missing):
+            log.warning("Could not route batch %s (unmatched subjects %s, rooms without subjects %s), "
+                        "requesting its rooms one at a time", space_id, unmatched, missing)
+            return await fetch_rooms_one_at_a_time(client, space_ids, start_date, page_size, executor)
+
+        # Only cached once it decoded, so a malformed body is never served from the cache
+        if response is not None and response.status_code != 304:
+            CACHE.set_body(url, None, body,
+                           etag=response.headers.get("ETag"),
+                           last_modified=response.headers.get("Last-Modified"))
+        return list(space_ids), rows
+    except httpx.HTTPStatusError as e:
+        if len(space_ids) > 1:
+            log.warning("Batch request for rooms %s failed with status %s, requesting its rooms one at a time",
+                        space_id, e.response.status_code)
+            return await fetch_rooms_one_at_a_time(client, space_ids, start_date, page_size, executor)
+        log.warning("Request error for rooms %s: %r", space_id, e)
+        return [], []
+    except httpx.HTTPError as e:
+        log.warning("Request error for rooms %s: %r", space_id, e)
+        return [], []
     except json.JSONDecodeError:
-        print(f"JSON decode error for room {space_id}")
-        return []
+        log.warning("JSON decode error for rooms %s", space_id)
+        return [], []
     except Exception as e:
-        print(f"Unexpected error for room {space_id}: {e}")
-        return []
+        log.warning("Unexpected error for rooms %s: %s", space_id, e)
+        return [], []
 
-def fetch_all_rooms_availability(room_ids, start_date=None, max_workers=40):
+async def fetch_all_rooms_availability(room_ids, start_date=None, batch_size=25, max_concurrency=40, db_path=DB_PATH,
+                                       parse_workers=0):
     """
-    Fetches room availability data for multiple rooms using multithreading.
+    Fetches room availability data for multiple rooms concurrently over one HTTP/2 client, batch_size rooms per request.
+
+    Rows are handed to a single writer task as each batch completes, so inserts overlap with the
+    requests still in flight instead of running after all of them. For every room fetched successfully,
+    bookings from start_date on that 25live no longer lists are deleted.
 
     Parameters:
         room_ids (list of dict): List of room dictionaries with 'id' and 'name' keys.
         start_date (str): Start date in YYYY-MM-DD format. Defaults to today's date if None.
-        max_workers (int): Maximum number of threads to use. Default is 20.
+        batch_size (int): Number of rooms fetched per request. Default is 25.
+        max_concurrency (int): Maximum number of requests in flight. Default is 40.
+        db_path (str): Path of the SQLite database to write to.
+        parse_workers (int): Processes decoding large responses off the event loop; None uses the CPU count.
+            Default is 0, which decodes everything inline; a week of bookings takes well under a millisecond.
 
     Returns:
         None
     """
-    all_availability = []
+    # Resolve today once so every room queries the same day, even across midnight
+    start_date = start_date or datetime.today().strftime("%Y-%m-%d")
+    semaphore = asyncio.Semaphore(max_concurrency)
+    # Holds the fetched rooms and their rows per batch; bounded so a slow disk throttles the fetchers instead of filling memory
+    queue = asyncio.Queue(maxsize=QUEUE_MAXSIZE)
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all tasks and map futures to room IDs
-        future_to_room = {
-            executor.submit(fetch_single_room_availability, room['id'], start_date): room
-            for room in room_ids
-        }
-        
-        # Initialize tqdm progress bar
-        for future in tqdm(as_completed(future_to_room), total=len(future_to_room), desc="Fetching room availability"):
-            room = future_to_room[future]
-            try:
-                result = future.result()
-                if result:
-                    all_availability.extend(result)
-            except Exception as e:
-                print(f"Error fetching data for room {room['id']}: {e}")
-    
-    # Store the collected data into the SQLite database
-    store_availability_to_db(all_availability)
+    async def bounded(client, space_ids, executor):
+        async with semaphore:
+            return await fetch_room_batch(client, space_ids, start_date, executor=executor)
 
+    conn = availability_db(db_path)
+    snapshot = Snapshot(start_date)
+    completed = False
+    writer = asyncio.create_task(write_availability(queue, conn, start_date, snapshot))
+    # Decoding very large responses (long date ranges) can be worth moving to worker processes, but only on request
+    executor = ProcessPoolExecutor(parse_workers) if parse_workers != 0 else None
+    try:
+        # One keep-alive client so every request reuses the same connections to 25live
+        limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        async with httpx.AsyncClient(http2=True, limits=limits) as client:
+            batches = chunked((room['id'] for room in room_ids), batch_size)
+            tasks = [bounded(client, space_ids, executor) for space_ids in batches]
+
+            # Initialize tqdm progress bar
+            for task in tqdm.as_completed(tasks, total=len(tasks), desc="Fetching room availability"):
+                try:
+                    fetched, rows = await task
+                    if fetched:
+                        await queue.put((fetched, rows))
+                except Exception as e:
+                    log.warning("Error fetching room availability: %s", e)
+        completed = True
+    finally:
+        # Tell the writer no more rows are coming and wait for the last flush
+        await queue.put(None)
+        written = await writer
+        snapshot.close(completed)
+        if executor is not None:
+            executor.shutdown()
 
-def store_availability_to_db(availability_data):
+    print(f"Inserted, updated or deleted {written} records in the database.")
+
+async def write_availability(queue, conn, start_date, snapshot=None, flush_rows=FLUSH_ROWS):
     """
-    Stores room availability data into an SQLite database.
+    Consumes (fetched room ids, rows) pairs from queue and writes them in batches until it receives None.
 
     Parameters:
-        availability_data (list of dict): Room availability data.
+        queue (asyncio.Queue): (room ids, availability rows in COLUMNS order) pairs, followed by None.
+        conn (sqlite3.Connection): Connection from availability_db.
+        start_date (str): First day of the scraped window, in YYYY-MM-DD format.
+        snapshot (Snapshot): Optional Parquet snapshot that also receives every batch.
+        flush_rows (int): Number of buffered rows that triggers a write.
 
     Returns:
-        None
+        int: Number of records inserted, updated or deleted.
     """
-    if not availability_data:
-        print("No availability data to store.")
-        return
+    buffered_rooms = []
+    buffer = []
+    written = 0
+    while True:
+        item = await queue.get()
+        if item is not None:
+            room_ids, rows = item
+            buffered_rooms.extend(room_ids)
+            buffer.extend(rows)
+        if buffered_rooms and (item is None or len(buffer) >= flush_rows):
+            # The write runs in a worker thread so the event loop keeps fetching meanwhile
+            written += await asyncio.to_thread(
+                store_availability_to_db, conn, buffer, snapshot, buffered_rooms, start_date
+            )
+            buffered_rooms = []
+            buffer = []
+        if item is None:
+            return written
 
-    conn = sqlite3.connect("room_availability.db")
-    cursor = conn.cursor()
-    
-    # Drop table if it exists to ensure schema matches
-    cursor.execute("DROP TABLE IF EXISTS room_availability")
 
-    # Create table with the correct schema
+# Connections stay open for the life of the process, one per database file, so each batch
+# skips reopening the database, its WAL and shared-memory files and reloading the schema
+_CONNECTIONS = {}
+_CONNECTIONS_LOCK = threading.Lock()
+# Serializes transactions on the shared connections
+_WRITE_LOCK = threading.Lock()
+
+# Bumped whenever the room_availability schema changes
+SCHEMA_VERSION = 3
+
+# Each transaction loads its rows into temp.scraped first, so they can be both upserted and
+# compared against what is stored. "WHERE true" keeps SQLite from parsing ON CONFLICT as a join constraint
+UPSERT_SQL = """
+    INSERT INTO room_availability (room_id, date, event_name, time_start, time_end, status, additional_details)
+    SELECT room_id, date, event_name, time_start, time_end, status, additional_details FROM temp.scraped WHERE true
+    ON CONFLICT (room_id, date, time_start, additional_details) DO UPDATE SET
+        event_name = excluded.event_name,
+        time_end = excluded.time_end,
+        status = excluded.status
+    WHERE (event_name, time_end, status) IS NOT (excluded.event_name, excluded.time_end, excluded.status)
+"""
+
+# Bookings of the fetched rooms in the scraped window that the scrape no longer lists: cancelled or moved
+PRUNE_SQL = """
+    DELETE FROM room_availability
+    WHERE room_id IN (SELECT room_id FROM temp.scraped_rooms)
+        AND date >= ?
+        AND NOT EXISTS (
+            SELECT 1 FROM temp.scraped AS s
+            WHERE s.room_id = room_availability.room_id
+                AND s.date = room_availability.date
+                AND s.time_start = room_availability.time_start
+                AND s.additional_details = room_availability.additional_details
+        )
+"""
+
+def create_scratch_tables(cursor):
+    """Creates the per-connection temp tables each write stages its rows and room ids in"""
     cursor.execute("""
-        CREATE TABLE room_availability (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+        CREATE TEMP TABLE IF NOT EXISTS scraped (
             room_id INTEGER,
             date TEXT,
             event_name TEXT,
@@ -131,46 +435,186 @@ def store_availability_to_db(availability_data):
             additional_details TEXT
         )
     """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS temp.scraped_key ON scraped (room_id, date, time_start, additional_details)
+    """)
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scraped_rooms (room_id INTEGER PRIMARY KEY)")
+
+def create_schema(cursor):
+    """
+    Creates the room_availability table if it doesn't exist yet, migrating tables written by older versions.
+
+    Version 0 tables have no unique key and may hold duplicate rows, so they are dropped.
+    Version 1 (surrogate AUTOINCREMENT id) and version 2 (keyed without the reservation id) tables have their
+    rows copied into the current table.
+
+    Several bookings can share a room, day and start time (cross-listed sections, for one), so each row is
+    identified by its reservation id (itemId2, stored as additional_details) as well.
+    """
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        cursor.execute("DROP TABLE IF EXISTS room_availability")
+    elif version < SCHEMA_VERSION:
+        cursor.execute("ALTER TABLE room_availability RENAME TO room_availability_old")
+
+    # Rows live in the leaves of the primary key B-tree, with no rowid, AUTOINCREMENT counter or separate index
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS room_availability (
+            room_id INTEGER,
+            date TEXT,
+            event_name TEXT,
+            time_start REAL,
+            time_end REAL,
+            status INTEGER,
+            additional_details TEXT,
+            PRIMARY KEY (room_id, date, time_start, additional_details)
+        ) WITHOUT ROWID
+    """)
+
+    if 1 <= version < SCHEMA_VERSION:
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO room_availability ({", ".join(COLUMNS)})
+            SELECT room_id, date, event_name, time_start, time_end, status, COALESCE(additional_details, '')
+            FROM room_availability_old WHERE time_start IS NOT NULL
+        """)
+        cursor.execute("DROP TABLE room_availability_old")
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def availability_db(db_path=DB_PATH):
+    """
+    Returns the process-wide connection to the availability database, opening it in autocommit mode
+    and bringing the schema up to date on first use.
+
+    The connection is shared across threads, so it is opened with check_same_thread=False and
+    writers take _WRITE_LOCK around each transaction.
+    """
+    with _CONNECTIONS_LOCK:
+        conn = _CONNECTIONS.get(db_path)
+        if conn is not None:
+            return conn
 
-    # Prepare data for insertion
-    records = []
-    for item in availability_data:
+        conn = connect(db_path, isolation_level=None, check_same_thread=False)
+        cursor = conn.cursor()
         try:
-            # Convert time_start and time_end to float, handle "N/A"
-            time_start = float(item["time_start"]) if item["time_start"] != "N/A" else None
-            time_end = float(item["time_end"]) if item["time_end"] != "N/A" else None
-            # Convert status to integer, handle "N/A"
-            status = int(item["status"]) if item["status"] != "N/A" else None
-            record = (
-                item["room_id"], 
-                item["date"], 
-                item["event_name"], 
-                time_start, 
-                time_end, 
-                status, 
-                item["additional_details"]
-            )
-            records.append(record)
-        except (KeyError, ValueError) as e:
-            print(f"Error processing item {item}: {e}")
+            cursor.execute("BEGIN IMMEDIATE")
+            create_schema(cursor)
+            create_scratch_tables(cursor)
+            cursor.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            conn.close()
+            raise
+        _CONNECTIONS[db_path] = conn
+        return conn
 
-    if not records:
-        print("No records to insert.")
-        return
+class Snapshot:
+    """
+    Parquet copy of one scrape at snapshots/<start date>/availability.parquet.
 
-    try:
-        # Insert data
-        cursor.executemany("""
-            INSERT INTO room_availability (room_id, date, event_name, time_start, time_end, status, additional_details)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, records)
-        
-        conn.commit()
-        print(f"Inserted {len(records)} records into the database.")
-    except Exception as e:
-        print(f"Error inserting records into the database: {e}")
-    finally:
-        conn.close()
+    Rows go to a temporary file that is only opened once there is something to write, and only replaces the
+    previous snapshot for the same start date once the scrape finishes. A run whose requests all fail, or that
+    is interrupted, leaves the earlier snapshot alone.
+    """
+
+    def __init__(self, start_date, snapshot_dir=SNAPSHOT_DIR):
+        self.path = os.path.join(snapshot_dir, start_date, "availability.parquet")
+        self._tmp_path = self.path + ".tmp"
+        self._writer = None
+
+    def write_table(self, table):
+        """Appends table as one row group"""
+        if table.num_rows == 0:
+            return
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._writer = pq.ParquetWriter(self._tmp_path, SNAPSHOT_SCHEMA, compression="zstd")
+        self._writer.write_table(table)
+
+    def close(self, completed=True):
+        """Closes the file, moving it into place if the scrape completed and discarding it otherwise"""
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        if completed:
+            os.replace(self._tmp_path, self.path)
+        else:
+            os.remove(self._tmp_path)
+
+def store_availability_to_db(conn, availability_data, snapshot=None, room_ids=None, start_date=None):
+    """
+    Upserts room availability data into an SQLite database in one transaction.
+
+    When room_ids and start_date are given, the scrape is taken as the complete list of those rooms' bookings
+    from start_date on, and stored bookings it doesn't include are deleted in the same transaction.
+
+    Parameters:
+        conn (sqlite3.Connection): Connection from availability_db.
+        availability_data (list of tuple): Room availability rows, in COLUMNS order.
+        snapshot (Snapshot): Optional Parquet snapshot the rows are appended to as well.
+        room_ids (list of int): Rooms that were fetched successfully, including ones without bookings.
+        start_date (str): First day of the scraped window, in YYYY-MM-DD format.
+
+    Returns:
+        int: Number of records inserted, updated or deleted.
+    """
+    prune = bool(room_ids) and start_date is not None
+    if not availability_data and not prune:
+        print("No availability data to store.")
+        return 0
+
+    # Prepare data for insertion, converting whole columns at once; missing and non-numeric values become NULL
+    # Built as object columns so None doesn't turn a column of IDs into floats before it is converted below
+    df = pd.DataFrame(availability_data, columns=COLUMNS, dtype=object)
+    df["time_start"] = pd.to_numeric(df["time_start"], errors="coerce")
+    df["time_end"] = pd.to_numeric(df["time_end"], errors="coerce")
+    df["status"] = pd.to_numeric(df["status"], errors="coerce").astype("Int64")
+    # itemId2 is usually numeric but the column is TEXT, so store it as text in both sinks.
+    # It is part of the primary key, which can't be NULL, so a missing one is stored as ""
+    df["additional_details"] = df["additional_details"].map(str, na_action="ignore").fillna("")
+    # sqlite3 binds plain Python objects, so only the numeric columns are boxed, with None for missing values
+    for column in ("time_start", "time_end", "status"):
+        df[column] = df[column].astype(object).where(df[column].notna(), None)
+
+    # Rows are keyed on (room_id, date, time_start, additional_details), so a booking without a start time can't be upserted
+    df = df.dropna(subset=["time_start"])
+
+    if snapshot is not None and not df.empty:
+        try:
+            snapshot.write_table(pa.Table.from_pandas(df, schema=SNAPSHOT_SCHEMA, preserve_index=False))
+        except (pa.ArrowException, OSError) as e:
+            log.error("Error writing the Parquet snapshot: %s", e)
+
+    with _WRITE_LOCK:
+        cursor = conn.cursor()
+        try:
+            # Take the write lock up front, readers keep seeing the old rows until COMMIT
+            cursor.execute("BEGIN IMMEDIATE")
+
+            # executemany pulls rows from the iterator one at a time, no list of records is built
+            cursor.execute("DELETE FROM temp.scraped")
+            cursor.executemany("INSERT INTO temp.scraped VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               df.itertuples(index=False, name=None))
+
+            # Insert new bookings and update changed ones; rows that didn't change are left untouched
+            cursor.execute(UPSERT_SQL)
+            written = cursor.rowcount
+
+            if prune:
+                cursor.execute("DELETE FROM temp.scraped_rooms")
+                cursor.executemany("INSERT OR IGNORE INTO temp.scraped_rooms VALUES (?)",
+                                   ((room_id,) for room_id in room_ids))
+                cursor.execute(PRUNE_SQL, (start_date,))
+                written += cursor.rowcount
+            
+            cursor.execute("COMMIT")
+            return written
+        except Exception as e:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            log.error("Error inserting records into the database: %s", e)
+            return 0
 
 
 if __name__ == "__main__":
@@ -187,6 +631,10 @@ if __name__ == "__main__":
     
     if room_ids:
         # Fetch availability for all rooms and store in the database
-        fetch_all_rooms_availability(room_ids)
+        listener, repeat_filter = start_logging()
+        try:
+            asyncio.run(fetch_all_rooms_availability(room_ids))
+        finally:
+            stop_logging(listener, repeat_filter)
     else:
         print("No room IDs to process.")
@@ -1,10 +1,10 @@
-import sqlite3
+from db_connection import connect
 
 def view_database_records(db_path):
     """
     Connects to the SQLite database at db_path and prints some records from the room_availability table.
     """
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     cursor = conn.cursor()
     
     cursor.execute("SELECT * FROM room_availability LIMIT 5;")